@@ -0,0 +1,20 @@
+import functools
+import yaml
+import os
+
+@functools.lru_cache(maxsize=1)
+def load_config():
+    """
+    Loads configuration from config.yaml file.
+    The result is cached for the lifetime of the process; restart to pick up changes.
+    """
+    config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config.yaml')
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f) or {}
+    except FileNotFoundError:
+        print(f"Warning: config.yaml not found at {config_path}. Using default values.")
+        return {}
+    except yaml.YAMLError as e:
+        print(f"Error parsing config.yaml: {e}. Using default values.")
+        return {}
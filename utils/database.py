@@ -1,115 +1,246 @@
+import hashlib
 import sqlite3
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta, timezone
+from .config import load_config
 
-DATABASE_FILE = 'news_data.db' # This will be configurable in config.yaml later
+DATABASE_FILE = load_config().get('database', {}).get('file_path', 'news_data.db')
+
+# WAL 允许读写并发，synchronous=NORMAL 在 WAL 下只在 checkpoint 时 fsync
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-64000',
+    'PRAGMA mmap_size=268435456',
+)
+
+MAX_SUMMARY_FAILURES = 3 # Rows that failed this many non-transient summarize attempts are no longer picked up
+INSERT_CHUNK_SIZE = 100 # Rows per multi-row INSERT; 8 params each stays well under SQLite's variable limit
+
+# 部分索引与查询共用同一谓词，保证 get_unsmarized_news 能命中索引
+_UNSUMMARIZED_WHERE = f"(summary IS NULL OR summary = '') AND summary_failures < {MAX_SUMMARY_FAILURES}"
+
+_conn = None
+_lock = threading.Lock()
+_conn_lock = threading.Lock() # Guards lazy creation of _conn; separate from _lock so callers may hold _lock
+
+def _get_conn():
+    """
+    Returns the module-level SQLite connection, opening it on first use.
+    PRAGMAs are applied once here so every later call reuses a warm page cache.
+    """
+    global _conn
+    if _conn is None:
+        with _conn_lock:
+            if _conn is None:
+                conn = sqlite3.connect(DATABASE_FILE, check_same_thread=False)
+                for pragma in PRAGMAS:
+                    conn.execute(pragma)
+                _conn = conn
+    return _conn
 
 def init_db():
     """
     Initializes the SQLite database and creates the news table if it doesn't exist.
     """
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS news (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            symbol TEXT NOT NULL,
-            title TEXT NOT NULL,
-            content TEXT,
-            summary TEXT,
-            link TEXT UNIQUE NOT NULL,
-            source TEXT,
-            published_at TEXT,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    conn = _get_conn()
+    with _lock, conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS news (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                symbol TEXT NOT NULL,
+                title TEXT NOT NULL,
+                content TEXT,
+                summary TEXT,
+                link TEXT UNIQUE NOT NULL,
+                source TEXT,
+                published_at TEXT,
+                published_ts INTEGER,
+                content_hash TEXT,
+                summary_failures INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        # 旧版数据库没有 published_ts 列：补列并从 published_at 文本回填
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(news)')]
+        if 'published_ts' not in columns:
+            conn.execute('ALTER TABLE news ADD COLUMN published_ts INTEGER')
+            conn.execute("UPDATE news SET published_ts = CAST(strftime('%s', substr(published_at, 1, 19)) AS INTEGER) WHERE published_at IS NOT NULL")
+        if 'content_hash' not in columns:
+            conn.execute('ALTER TABLE news ADD COLUMN content_hash TEXT')
+        if 'summary_failures' not in columns:
+            conn.execute('ALTER TABLE news ADD COLUMN summary_failures INTEGER NOT NULL DEFAULT 0')
+        # 一次性数据迁移，按 user_version 记录已执行的步骤
+        user_version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if user_version < 1:
+            # 旧版本会把 LLM 失败信息写成摘要：清空，让下一轮重新生成
+            conn.execute("UPDATE news SET summary = NULL WHERE summary LIKE 'Error Summary:%'")
+        if user_version < 2:
+            # 为旧数据回填 content_hash，使已有摘要可以被转载文章复用
+            conn.create_function('sha1', 1, content_hash, deterministic=True)
+            conn.execute('UPDATE news SET content_hash = sha1(content) WHERE content_hash IS NULL AND content IS NOT NULL')
+            conn.execute('PRAGMA user_version = 2')
+        # 日期范围查询按整数时间戳走索引范围扫描；部分索引只覆盖尚未生成摘要的行
+        conn.execute('DROP INDEX IF EXISTS idx_news_pub_sym')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_news_pubts_sym ON news(published_ts, symbol)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_news_content_hash ON news(content_hash)')
+        conn.execute('DROP INDEX IF EXISTS idx_news_summary_null')
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_news_unsummarized ON news(id) WHERE {_UNSUMMARIZED_WHERE}")
     print(f"Database initialized and table 'news' ensured in {DATABASE_FILE}")
 
-def save_news(news_items):
+def _published_ts(item):
+    """
+    Returns the unix epoch of a news item, parsing the 'published' text if no epoch is given.
+    Returns None if 'published' is neither an epoch nor a 'YYYY-MM-DD HH:MM:SS UTC' string.
+    """
+    if item.get('published_ts') is not None:
+        return item['published_ts']
+    published = item.get('published')
+    if isinstance(published, (int, float)):
+        return int(published)
+    try:
+        return int(datetime.strptime(published, '%Y-%m-%d %H:%M:%S UTC').replace(tzinfo=timezone.utc).timestamp())
+    except (TypeError, ValueError):
+        return None
+
+def content_hash(text):
+    """
+    Returns the SHA1 hex digest of a news body, or None if there is no content.
+    Used to recognise republished articles whose summary already exists.
+    """
+    if not text:
+        return None
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+def _date_to_ts(date_str):
+    """
+    Converts a 'YYYY-MM-DD' date string to the unix epoch of its midnight (UTC).
+    """
+    return int(datetime.strptime(date_str, '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp())
+
+def save_news(news_items, symbol=None):
     """
     Saves a list of news items into the database.
-    Skips items if their link already exists to prevent duplicates.
-    """
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    saved_count = 0
-    for item in news_items:
-        try:
-            cursor.execute('''
-                INSERT INTO news (symbol, title, content, link, source, published_at)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                item.get('symbol'),
-                item.get('title'),
-                item.get('content'),
-                item.get('link'),
-                item.get('source'),
-                item.get('published')
-            ))
-            saved_count += 1
-        except sqlite3.IntegrityError:
-            print(f"Skipping duplicate news: {item.get('title')} (Link: {item.get('link')})")
-        except Exception as e:
-            print(f"Error saving news item {item.get('title')}: {e}")
-    conn.commit()
-    conn.close()
-    print(f"Saved {saved_count} new news items to the database.")
+    If symbol is given it is stored for every item, otherwise each item's own 'symbol' is used.
+    Skips items if their link already exists or a required field (title, link) is missing.
+    Returns the newly inserted rows as (id, title, content, content_hash) tuples,
+    so callers can summarize them without querying the table again.
+    """
+    rows = [(
+        symbol if symbol is not None else item.get('symbol'),
+        item.get('title'),
+        item.get('content'),
+        item.get('link'),
+        item.get('source'),
+        item.get('published'),
+        _published_ts(item),
+        content_hash(item.get('content'))
+    ) for item in news_items]
+    conn = _get_conn()
+    new_items = []
+    # 单个事务内分块执行多行 INSERT；INSERT OR IGNORE 逐行跳过重复 link 或缺少必填字段的条目，
+    # 不会回滚整块；RETURNING (SQLite >= 3.35) 带回新行。
+    # executemany 会丢弃 RETURNING 结果，因此把每块拼成一条多行 VALUES 语句
+    with _lock, conn:
+        for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+            chunk = rows[start:start + INSERT_CHUNK_SIZE]
+            values = ', '.join(['(?, ?, ?, ?, ?, ?, ?, ?)'] * len(chunk))
+            new_items.extend(conn.execute(f'''
+                INSERT OR IGNORE INTO news (symbol, title, content, link, source, published_at, published_ts, content_hash)
+                VALUES {values}
+                RETURNING id, title, content, content_hash
+            ''', [value for row in chunk for value in row]).fetchall())
+    skipped_count = len(rows) - len(new_items)
+    if skipped_count:
+        print(f"Skipped {skipped_count} duplicate or invalid news items.")
+    print(f"Saved {len(new_items)} new news items to the database.")
+    return new_items
 
 def get_unsmarized_news():
     """
-    Retrieves news items that do not have a summary yet.
-    """
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    cursor.execute('SELECT id, title, content FROM news WHERE summary IS NULL OR summary = ""')
-    news_to_summarize = []
-    for row in cursor.fetchall():
-        news_to_summarize.append({
-            'id': row[0],
-            'title': row[1],
-            'content': row[2]
-        })
-    conn.close()
-    return news_to_summarize
+    Retrieves news items that do not have a summary yet, skipping rows that
+    already failed MAX_SUMMARY_FAILURES times with a non-transient error.
+    Returns a list of (id, title, content, content_hash) tuples.
+    """
+    with _lock:
+        return _get_conn().execute(f"SELECT id, title, content, content_hash FROM news WHERE {_UNSUMMARIZED_WHERE}").fetchall()
+
+def get_summaries_by_content_hash(content_hashes):
+    """
+    Returns a {content_hash: summary} dict for already summarized news with the given content hashes.
+    """
+    content_hashes = [h for h in content_hashes if h]
+    summaries = {}
+    # 分批查询，避免超出 SQLite 的参数个数上限
+    for start in range(0, len(content_hashes), 500):
+        chunk = content_hashes[start:start + 500]
+        placeholders = ', '.join('?' * len(chunk))
+        with _lock:
+            rows = _get_conn().execute(
+                f"SELECT content_hash, summary FROM news WHERE content_hash IN ({placeholders}) AND summary IS NOT NULL AND summary != ''",
+                chunk
+            ).fetchall()
+        summaries.update(rows)
+    return summaries
+
+def record_summary_failures(news_ids):
+    """
+    Increments the summary failure count for the given news IDs.
+    """
+    if not news_ids:
+        return
+    conn = _get_conn()
+    with _lock, conn:
+        conn.executemany('UPDATE news SET summary_failures = summary_failures + 1 WHERE id = ?', [(news_id,) for news_id in news_ids])
 
 def update_news_summary(news_id, summary):
     """
     Updates the summary for a specific news item by its ID.
     """
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    cursor.execute('UPDATE news SET summary = ? WHERE id = ?', (summary, news_id))
-    conn.commit()
-    conn.close()
+    conn = _get_conn()
+    with _lock, conn:
+        conn.execute('UPDATE news SET summary = ? WHERE id = ?', (summary, news_id))
     print(f"Updated summary for news ID: {news_id}")
 
+def update_news_summaries_bulk(pairs):
+    """
+    Updates summaries for many news items in a single transaction.
+    pairs is a list of (news_id, summary) tuples.
+    """
+    if not pairs:
+        return
+    conn = _get_conn()
+    with _lock, conn:
+        conn.executemany('UPDATE news SET summary = ? WHERE id = ?', [(summary, news_id) for news_id, summary in pairs])
+    print(f"Updated summaries for {len(pairs)} news items.")
+
 def get_news_by_date_range(start_date_str, end_date_str, symbol=None):
     """
     Retrieves news items (with summaries) within a specified date range for a given symbol.
     Dates should be in 'YYYY-MM-DD' format.
     """
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    
-    query = 'SELECT title, summary, published_at, link FROM news WHERE published_at BETWEEN ? AND ?'
-    params = (f"{start_date_str} 00:00:00 UTC", f"{end_date_str} 23:59:59 UTC")
+    # 半开区间 [start 00:00, end+1 00:00)，按整数时间戳比较
+    start_ts = _date_to_ts(start_date_str)
+    end_ts = _date_to_ts(end_date_str) + int(timedelta(days=1).total_seconds())
+    query = 'SELECT title, summary, published_at, link FROM news WHERE published_ts >= ? AND published_ts < ?'
+    params = (start_ts, end_ts)
     
     if symbol:
         query += ' AND symbol = ?'
         params += (symbol,)
         
-    cursor.execute(query, params)
+    with _lock:
+        rows = _get_conn().execute(query, params).fetchall()
     
     news_summaries = []
-    for row in cursor.fetchall():
+    for row in rows:
         news_summaries.append({
             'title': row[0],
             'summary': row[1],
 #            'published_at': row[2],
 #            'link': row[3]
         })
-    conn.close()
     return news_summaries
 
 if __name__ == '__main__':
@@ -122,5 +253,5 @@ if __name__ == '__main__':
     # news = get_unsmarized_news()
     # print(f"Unsummarized news: {news}")
     # if news:
-    #     update_news_summary(news[0]['id'], "This is a test summary.")
+    #     update_news_summary(news[0][0], "This is a test summary.")
     #     print(get_news_by_date_range('2025-08-01', '2025-08-01', 'TEST'))
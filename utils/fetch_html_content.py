@@ -1,25 +1,38 @@
 import json
+import re
 import requests
-import yaml
-import os
 import time, random
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .config import load_config
 
-def load_config():
-    """
-    Loads configuration from config.yaml file.
-    """
-    config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config.yaml')
-    try:
-        with open(config_path, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f)
-    except FileNotFoundError:
-        print(f"Warning: config.yaml not found at {config_path}. Using default values.")
-        return {}
-    except yaml.YAMLError as e:
-        print(f"Error parsing config.yaml: {e}. Using default values.")
-        return {}
+try:
+    import orjson # 更快的 JSON 解析；未安装时退回标准库 json
+except ImportError:
+    orjson = None
+
+_json_loads = orjson.loads if orjson else json.loads
+
+# 线程间共享的 Session，复用到 tradingview.com 的 keep-alive 连接；
+# 连接池大小与抓取线程数匹配，瞬时错误 (429/5xx) 自动退避重试
+_SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), allowed_methods=('GET',))
+)
+_SESSION.mount('https://', _ADAPTER)
+_SESSION.mount('http://', _ADAPTER)
+
+# 直接用正则截取嵌入的 JSON 数据，避免为 JSON 路径构建整棵 DOM 树
+_INIT_DATA_RE = re.compile(r'<script[^>]*type="application/prs\.init-data\+json"[^>]*>(.*?)</script>', re.S)
+# 降级解析只需要标题和正文容器，只构建这些子树
+_FALLBACK_STRAINER = SoupStrainer(['h1', 'div'])
+
+MAX_HTML_BYTES = 2 * 1024 * 1024 # Default size cap for a single article page
 
 def fetch_html_content(url):
     """
@@ -39,11 +52,21 @@ def fetch_html_content(url):
     
     # 获取超时设置https://www.tradingview.com/
     timeout = config.get('news', {}).get('timeout_seconds', 10)
+    max_bytes = config.get('news', {}).get('max_html_bytes', MAX_HTML_BYTES)
     
     try:
-        response = requests.get(url, headers=headers, timeout=timeout)
-        response.raise_for_status() # Raise an HTTPError for bad responses (4xx or 5xx)
-        return response.text
+        # 流式读取并限制大小，超限页面提前中止；读完后只解码一次
+        with _SESSION.get(url, headers=headers, timeout=timeout, stream=True) as response:
+            response.raise_for_status() # Raise an HTTPError for bad responses (4xx or 5xx)
+            chunks = []
+            size = 0
+            for chunk in response.iter_content(chunk_size=65536):
+                size += len(chunk)
+                if size > max_bytes:
+                    print(f"Warning: Response from {url} exceeds {max_bytes} bytes. Skipping.")
+                    return None
+                chunks.append(chunk)
+            return b"".join(chunks).decode(response.encoding or 'utf-8', errors='replace')
     except requests.exceptions.RequestException as e:
         print(f"Error fetching URL {url}: {e}")
         return None
@@ -57,50 +80,49 @@ def parse_news_html(html_content):
     if not html_content:
         return {"title": "Error", "content": "Empty HTML content provided."}
 
-    soup = BeautifulSoup(html_content, 'html.parser')
-    
     title = ""
     content_paragraphs = []
 
     # --- 优先策略：从嵌入的 JSON 数据中提取 ---
     # 现代网页经常将数据嵌入在 <script> 标签中
-    scripts = soup.find_all('script', type='application/prs.init-data+json')
-    for script in scripts:
+    for blob in _INIT_DATA_RE.findall(html_content):
+        # 子串检查远比 JSON 解码便宜：不含 "story" 的 blob 直接跳过
+        if '"story"' not in blob:
+            continue
         try:
             # 尝试解析 script 标签内的 JSON 内容
-            data = json.loads(script.string)
+            data = _json_loads(blob)
             
-            # 遍历 JSON 数据，寻找包含 'story' 的键
-            for key in data:
-                if isinstance(data[key], dict) and 'story' in data[key]:
-                    story_data = data[key]['story']
-                    
-                    # 提取标题
-                    if 'title' in story_data:
-                        title = story_data['title']
+            # 遍历 JSON 数据，寻找包含 'story' 的值
+            stories = (value['story'] for value in data.values() if isinstance(value, dict) and 'story' in value)
+            for story_data in stories:
+                # 提取标题
+                if 'title' in story_data:
+                    title = story_data['title']
+                
+                # 提取内容 (以 AST 结构存储)
+                if 'astDescription' in story_data and 'children' in story_data['astDescription']:
+                    for paragraph_node in story_data['astDescription']['children']:
+                        # 确保节点是段落类型并且有内容
+                        if paragraph_node.get('type') == 'p' and 'children' in paragraph_node:
+                            paragraph_text = "".join(p_child for p_child in paragraph_node['children'] if isinstance(p_child, str))
+                            if paragraph_text:
+                                content_paragraphs.append(paragraph_text)
                     
-                    # 提取内容 (以 AST 结构存储)
-                    if 'astDescription' in story_data and 'children' in story_data['astDescription']:
-                        for paragraph_node in story_data['astDescription']['children']:
-                            # 确保节点是段落类型并且有内容
-                            if paragraph_node.get('type') == 'p' and 'children' in paragraph_node:
-                                paragraph_text = "".join(p_child for p_child in paragraph_node['children'] if isinstance(p_child, str))
-                                if paragraph_text:
-                                    content_paragraphs.append(paragraph_text)
-                        
-                        # 如果通过 JSON 成功提取到内容，直接返回结果
-                        if title and content_paragraphs:
-                            return {
-                                "title": title.strip(),
-                                "content": "\n".join(content_paragraphs)
-                            }
-        except (json.JSONDecodeError, TypeError, KeyError):
+                    # 如果通过 JSON 成功提取到内容，直接返回结果
+                    if title and content_paragraphs:
+                        return {
+                            "title": title.strip(),
+                            "content": "\n".join(content_paragraphs)
+                        }
+        except (json.JSONDecodeError, TypeError, KeyError, AttributeError):
             # 如果解析失败或结构不匹配，就跳过这个 script 标签
             continue
 
     # --- 降级策略：如果 JSON 提取失败，则解析 HTML 标签 ---
     # (此逻辑与你原始代码相似，但做了优化和简化)
     print("Warning: Could not parse embedded JSON. Falling back to HTML tag parsing.")
+    soup = BeautifulSoup(html_content, 'lxml', parse_only=_FALLBACK_STRAINER)
     
     # 查找标题
     title_tag = soup.find('h1', class_='title-KX2tCBZq') # 使用更精确的 class
@@ -139,8 +161,12 @@ def save_to_json(data, filename="news_output.json"):
     """
     Saves the extracted data to a JSON file.
     """
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
+    if orjson:
+        with open(filename, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    else:
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=4)
     print(f"News content saved to {filename}")
 
 def fetch_news_content(news_url):
@@ -162,7 +188,7 @@ def get_exchange_from_symbol(symbol):
         raise ValueError("Alpha Vantage API key is not configured in config.yaml.")
     
     url = f"https://www.alphavantage.co/query?function=OVERVIEW&symbol={symbol}&apikey={api_key}"
-    r = requests.get(url)
+    r = _SESSION.get(url)
     data = r.json()
     if 'Exchange' in data:
         return data['Exchange']
@@ -190,7 +216,7 @@ def fetch_tradingview_news(symbol, target_date = '2025-07-31', window = 1):
     end_time = start_time + timedelta(days=window)
 
     print(start_time, end_time)
-    response = requests.get(url, params=params)
+    response = _SESSION.get(url, params=params)
     response.raise_for_status()
     news_items = response.json().get("items", [])
 
@@ -200,23 +226,38 @@ def fetch_tradingview_news(symbol, target_date = '2025-07-31', window = 1):
         "end_time": end_time.isoformat(),
         "news": []
     }
+    # 直接比较 epoch 整数，只为保留下来的条目构造 datetime
+    start_ts = start_time.replace(tzinfo=timezone.utc).timestamp()
+    end_ts = end_time.replace(tzinfo=timezone.utc).timestamp()
+    candidates = []
     for item in news_items:
-        # item['published']: 2025-07-30 16:20:12 UTC
-        published_dt = datetime.utcfromtimestamp(item["published"])
-        if published_dt < start_time or published_dt > end_time:
+        # item['published']: unix epoch, e.g. 1753892412 (2025-07-30 16:20:12 UTC)
+        published_ts = item["published"]
+        if published_ts < start_ts or published_ts > end_ts:
             continue
         link = item.get("link") or f"https://www.tradingview.com{item.get('storyPath','')}"
         if not link.startswith('https://www.tradingview.com'):
             continue
-        related = ", ".join([s["symbol"] for s in item.get("relatedSymbols", [])])
+        candidates.append((item, link, published_ts))
+
+    def fetch_candidate(candidate):
+        item, link, _ = candidate
         print(f"Fetching {item.get('title')}\n")
         time.sleep(random.uniform(1,4))
+        return fetch_news_content(link)['content']
+
+    # 文章抓取是网络 I/O 密集型，并发请求；executor.map 保持原始顺序
+    max_workers = load_config().get('news', {}).get('max_workers', 16)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        contents = list(executor.map(fetch_candidate, candidates))
 
-        content = fetch_news_content(link)['content']
+    for (item, link, published_ts), content in zip(candidates, contents):
+        related = ", ".join([s["symbol"] for s in item.get("relatedSymbols", [])])
         all_news["news"].append({
             "title": item.get("title", "No Title"),
             "source": item.get("source", "Unknown Source"),
-            "published": published_dt.strftime('%Y-%m-%d %H:%M:%S UTC'),
+            "published": datetime.fromtimestamp(published_ts, timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC'),
+            "published_ts": published_ts,
             "related_symbols": related,
             "link": link,
             "content": content
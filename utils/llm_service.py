@@ -1,22 +1,11 @@
-import yaml
-import os
-from openai import OpenAI
+from openai import OpenAI, APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential_jitter
+from .config import load_config
 # You would typically import your LLM client here, e.g., from openai import OpenAI
 
-def load_config():
-    """
-    Loads configuration from config.yaml file.
-    """
-    config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config.yaml')
-    try:
-        with open(config_path, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f)
-    except FileNotFoundError:
-        print(f"Warning: config.yaml not found at {config_path}. Using default values.")
-        return {}
-    except yaml.YAMLError as e:
-        print(f"Error parsing config.yaml: {e}. Using default values.")
-        return {}
+SUMMARY_MAX_TOKENS = 256 # Token budget for a single article summary
+# Transient API errors worth retrying; anything else (e.g. BadRequestError, AuthenticationError) fails immediately
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
 
 class LLMService:
     def __init__(self):
@@ -41,26 +30,43 @@ class LLMService:
     def summarize_text(self, text: str) -> str:
         """
         Summarizes the given text using the configured LLM.
+        Transient API errors are retried with backoff; if they persist the exception is raised
+        so the caller can leave the news item unsummarized instead of storing an error text.
         """
+        if not text:
+            return "No content to summarize."
         if not self.api_key:
             return f"Placeholder Summary: {text[:100]}..." # Return placeholder if no API key
 
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that summarizes news articles concisely. Output format: Summary: <summary>"},
-                    {"role": "user", "content": f"Please summarize the following news article:\n\n{text}"}
-                ],
-                max_tokens=2048
-            )
-            return response.choices[0].message.content.strip()
-        except Exception as e:
-            print(f"Error summarizing text with LLM: {e}")
-            return f"Error Summary: Failed to summarize due to LLM error. Original text start: {text[:100]}..."
-        
-        # Placeholder implementation
-        return f"Summary of: {text[:200]}..." if text else "No content to summarize."
+        return self._summarize_impl(text)
+
+    @retry(
+        stop=stop_after_attempt(5),
+        wait=wait_exponential_jitter(initial=1, max=30),
+        retry=retry_if_exception_type(RETRYABLE_ERRORS),
+        reraise=True
+    )
+    def _summarize_impl(self, text: str) -> str:
+        """
+        Calls the LLM for a single summary.
+        Duplicate articles are already deduplicated by content_hash in NewsProcessor.
+        """
+        # SDK 自身的重试关闭，只保留 tenacity 这一层，避免重试次数相乘
+        response = self.client.with_options(max_retries=0).chat.completions.create(
+            model=self.model_name,
+            messages=[
+                {"role": "system", "content": "You are a helpful assistant that summarizes news articles concisely. Output format: Summary: <summary>"},
+                {"role": "user", "content": f"Please summarize the following news article:\n\n{text}"}
+            ],
+            max_tokens=SUMMARY_MAX_TOKENS,
+            stream=True
+        )
+        # 流式接收 token，边生成边累积
+        buf = []
+        for chunk in response:
+            if chunk.choices:
+                buf.append(chunk.choices[0].delta.content or "")
+        return "".join(buf).strip()
 
     def generate_daily_report(self, news_summaries: list) -> str:
         """
@@ -72,12 +78,12 @@ class LLMService:
         if not news_summaries:
             return "No news summaries provided for daily report."
 
-        report_content = "Daily News Report:\n\n"
-        for i, item in enumerate(news_summaries):
-            report_content += f"{i+1}. {item.get('title', 'No Title')}\n"
-            report_content += f"   Summary: {item.get('summary', 'No Summary')}\n"
-#            report_content += f"   Published: {item.get('published_at', 'N/A')}\n"
-#            report_content += f"   Link: {item.get('link', 'N/A')}\n\n"
+        # 用 join 一次性拼接，避免字符串 += 的二次方开销
+        report_content = "Daily News Report:\n\n" + "".join(
+            f"{i+1}. {item.get('title', 'No Title')}\n"
+            f"   Summary: {item.get('summary', 'No Summary')}\n"
+            for i, item in enumerate(news_summaries)
+        )
         
         # Example LLM call for daily report (replace with your actual LLM client logic)
         try:
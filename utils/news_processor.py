@@ -1,12 +1,14 @@
-import os
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from . import database
-from .llm_service import LLMService
+from .llm_service import LLMService, RETRYABLE_ERRORS
+
+SUMMARY_FLUSH_SIZE = 50 # Number of summaries buffered before writing them to the database
 
 class NewsProcessor:
     def __init__(self):
         self.llm_service = LLMService()
         database.init_db() # Ensure database is initialized when processor is created
+        self._orphans_recovered = False # Cleared whenever a summary fails to persist, so the next call rescans
 
     def process_and_summarize_news(self, news_data):
         """
@@ -14,27 +16,87 @@ class NewsProcessor:
         news_data is expected to be a dictionary with 'symbol' and 'news' list.
         """
         symbol = news_data.get('symbol', 'UNKNOWN')
-        news_items_for_db = []
-        for item in news_data.get('news', []):
-            # Add symbol to each news item for database storage
-            item['symbol'] = symbol
-            news_items_for_db.append(item)
+        news_items = news_data.get('news', [])
         
-        if news_items_for_db:
-            database.save_news(news_items_for_db)
+        new_news = []
+        if news_items:
+            # symbol 在写库时统一注入，无需逐条修改 news_items
+            new_news = database.save_news(news_items, symbol)
         else:
             print("No news items to save.")
 
-        # Summarize unsmarized news
-        unsmarized_news = database.get_unsmarized_news()
-        if unsmarized_news:
-            print(f"Found {len(unsmarized_news)} news items to summarize.")
-            for news_item in unsmarized_news:
-                summary = self.llm_service.summarize_text(news_item['content'])
-                database.update_news_summary(news_item['id'], summary)
+        # Summarize the rows just inserted; the first call (and any call after a
+        # summary failed to persist) also recovers rows left unsummarized earlier
+        if self._orphans_recovered:
+            unsmarized_news = new_news
+        else:
+            unsmarized_news = database.get_unsmarized_news()
+            self._orphans_recovered = True
+        # 按内容分组：内容相同的文章 (转载) 只请求一次 LLM；无内容的行单独成组
+        groups = {}
+        for news_id, title, content, item_hash in unsmarized_news:
+            ids, _ = groups.setdefault(item_hash or news_id, ([], content))
+            ids.append(news_id)
+
+        if groups:
+            print(f"Found {sum(len(ids) for ids, _ in groups.values())} news items to summarize.")
+            # 已有摘要的内容直接复用数据库中的结果
+            known_summaries = database.get_summaries_by_content_hash([key for key in groups if isinstance(key, str)])
+            pending = []
+            for item_hash, summary in known_summaries.items():
+                ids, _ = groups.pop(item_hash)
+                pending.extend((news_id, summary) for news_id in ids)
+            if len(pending) >= SUMMARY_FLUSH_SIZE:
+                self._flush_summaries(pending)
+                pending = []
+
+            # LLM 请求是网络 I/O 密集型，用线程池并发发送；并发数受配置限制以避免触发限流
+            max_workers = self.llm_service.llm_config.get('max_workers', 16)
+            failed_ids = []
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {
+                    executor.submit(self.llm_service.summarize_text, content): ids
+                    for ids, content in groups.values()
+                }
+                for future in as_completed(futures):
+                    try:
+                        summary = future.result()
+                    except RETRYABLE_ERRORS as e:
+                        # 临时错误：摘要保持为空，下一轮重新扫描未摘要的新闻时再重试
+                        print(f"Error summarizing news IDs {futures[future]}: {e}. Will retry next cycle.")
+                        self._orphans_recovered = False
+                        continue
+                    except Exception as e:
+                        # 非临时错误 (如超出上下文、鉴权失败)：记录失败次数，不触发重新扫描
+                        print(f"Error summarizing news IDs {futures[future]}: {e}. Recording failure.")
+                        failed_ids.extend(futures[future])
+                        continue
+                    if not summary:
+                        # 空摘要不写库，保持未摘要状态以便下一轮重试
+                        print(f"Empty summary for news IDs {futures[future]}. Will retry next cycle.")
+                        self._orphans_recovered = False
+                        continue
+                    pending.extend((news_id, summary) for news_id in futures[future])
+                    if len(pending) >= SUMMARY_FLUSH_SIZE:
+                        self._flush_summaries(pending)
+                        pending = []
+            self._flush_summaries(pending)
+            if failed_ids:
+                database.record_summary_failures(failed_ids)
         else:
             print("No new news items to summarize.")
 
+    def _flush_summaries(self, pending):
+        """
+        Writes buffered (id, summary) pairs. On failure the rows stay unsummarized
+        and are picked up again by the next cycle's recovery scan.
+        """
+        try:
+            database.update_news_summaries_bulk(pending)
+        except Exception as e:
+            print(f"Error saving {len(pending)} summaries: {e}. Will retry next cycle.")
+            self._orphans_recovered = False
+
     def create_daily_report(self, target_date_str: str, symbol: str = None) -> str:
         """
         Generates a daily news report for a specific date and optional symbol.